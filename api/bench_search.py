@@ -0,0 +1,133 @@
+"""
+Benchmark de GET /files/search (requête SQL + index pg_trgm).
+
+Usage (dans le conteneur api) :
+  python bench_search.py --seed --rows 2000000 --users 2000 --heavy-rows 150000
+  python bench_search.py --iterations 3000 --heavy-share 0.5
+
+--seed insère des lignes factices (user_email 'bench-*') dans file_metadata,
+dont un utilisateur « lourd » (bench-heavy@example.com) possédant --heavy-rows fichiers.
+--cleanup les supprime.
+"""
+
+import argparse, asyncio, random, statistics, time
+from database import get_pool, search_user_files
+
+
+WORDS = [
+    "rapport", "facture", "contrat", "photo", "vacances", "budget", "projet",
+    "reunion", "presentation", "devis", "releve", "scan", "export", "planning",
+    "cv", "lettre", "bilan", "annexe", "notes", "archive",
+]
+MIME_TYPES = ["application/pdf", "image/jpeg", "image/png", "text/plain", "text/csv"]
+HEAVY_USER = "bench-heavy@example.com"
+QUERY_KINDS = ("mot", "préfixe", "faute", "court")
+
+SEED_SQL = """
+INSERT INTO public.file_metadata
+    (user_email, filename, object_name, bucket_name, size_bytes, mime_type, sha256, uploaded_at, deleted_at)
+SELECT
+    CASE WHEN i <= $4 THEN $5 ELSE 'bench-' || (i % $2) || '@example.com' END,
+    ($3::text[])[1 + floor(random() * cardinality($3::text[]))::int] || '_'
+        || ($3::text[])[1 + floor(random() * cardinality($3::text[]))::int] || '_'
+        || (i % 1000) || (ARRAY['.pdf','.jpg','.png','.txt','.csv'])[1 + i % 5],
+    'bench/' || i,
+    'user-bench-' || (i % $2),
+    (random() * 100000000)::bigint,
+    (ARRAY['application/pdf','image/jpeg','image/png','text/plain','text/csv'])[1 + i % 5],
+    repeat('0', 64),
+    NOW() - (random() * interval '730 days'),
+    CASE WHEN random() < 0.05 THEN NOW() END
+FROM generate_series(1, $1) AS i
+"""
+
+
+def random_query(kind: str) -> str:
+    """Terme de recherche : mot exact, préfixe, mot avec une faute de frappe ou 1-2 caractères."""
+    word = random.choice(WORDS)
+    if kind == "mot":
+        return word
+    if kind == "préfixe":
+        return word[: max(3, len(word) // 2)]
+    if kind == "court":
+        # Début de mot, ou deux lettres quelconques (souvent sans résultat)
+        if random.random() < 0.5:
+            return "".join(random.choices("abcdefghijklmnopqrstuvwxyz", k=2))
+        return word[: random.choice((1, 2))]
+    # Faute de frappe : substitution ou inversion de deux lettres
+    i = random.randrange(len(word) - 1)
+    if random.random() < 0.5:
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return word[:i] + random.choice("aeiou") + word[i + 1:]
+
+
+def percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+async def seed(rows: int, users: int, heavy_rows: int) -> None:
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        start = time.perf_counter()
+        await conn.execute(SEED_SQL, rows, users, WORDS, heavy_rows, HEAVY_USER)
+        await conn.execute("ANALYZE public.file_metadata")
+    print(f"seed : {rows} lignes / {users} utilisateurs (dont {heavy_rows} pour {HEAVY_USER}) en {time.perf_counter() - start:.1f}s")
+
+
+async def cleanup() -> None:
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        result = await conn.execute("DELETE FROM public.file_metadata WHERE user_email LIKE 'bench-%'")
+    print(f"cleanup : {result}")
+
+
+async def run(iterations: int, users: int, heavy_share: float) -> None:
+    # Échauffement (cache du pool et des pages d'index)
+    for _ in range(20):
+        await search_user_files(f"bench-{random.randrange(users)}@example.com", random_query("mot"))
+
+    latencies: dict[tuple[str, str], list[float]] = {}
+    for _ in range(iterations):
+        heavy = random.random() < heavy_share
+        user = HEAVY_USER if heavy else f"bench-{random.randrange(users)}@example.com"
+        kind = random.choice(QUERY_KINDS)
+        filters = {}
+        if random.random() < 0.3:
+            filters["mime_type"] = random.choice(MIME_TYPES)
+        if random.random() < 0.2:
+            filters["min_size"] = 1_000_000
+        start = time.perf_counter()
+        await search_user_files(user, random_query(kind), **filters)
+        latencies.setdefault(("lourd" if heavy else "standard", kind), []).append((time.perf_counter() - start) * 1000)
+
+    everything = [ms for values in latencies.values() for ms in values]
+    print(f"search : {iterations} requêtes")
+    print(f"  {'utilisateur':<12}{'requête':<10}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}")
+    for (user_kind, kind), values in sorted(latencies.items()):
+        print(f"  {user_kind:<12}{kind:<10}{len(values):>6}{percentile(values, 0.50):>10.2f}{percentile(values, 0.95):>10.2f}")
+    print(f"  {'total':<22}{len(everything):>6}{percentile(everything, 0.50):>10.2f}{percentile(everything, 0.95):>10.2f}")
+    print(f"  moyenne {statistics.mean(everything):.2f} ms, p99 {percentile(everything, 0.99):.2f} ms")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", action="store_true")
+    parser.add_argument("--cleanup", action="store_true")
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--heavy-rows", type=int, default=150_000)
+    parser.add_argument("--heavy-share", type=float, default=0.2, help="part des requêtes émises par l'utilisateur lourd")
+    parser.add_argument("--iterations", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.cleanup:
+        await cleanup()
+        return
+    if args.seed:
+        await seed(args.rows, args.users, args.heavy_rows)
+    await run(args.iterations, args.users, args.heavy_share)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,126 @@
+"""
+Benchmark du listing GET /files/ (lecture + sérialisation, 10k lignes par défaut).
+
+Compare, pour un même utilisateur :
+  - legacy         : Record -> dicts intermédiaires -> jsonable_encoder -> json (avant orjson)
+  - response_model : Record -> dict -> FileListResponse -> orjson (chemin FastAPI d'un modèle)
+  - records_orjson : Record -> dict(record) dans le hook default= d'orjson
+  - json_agg       : corps JSON construit par PostgreSQL (chemin actuel, list_user_files_json)
+« lecture seule » donne le coût du fetch asyncpg, commun aux trois premiers chemins.
+« CPU Python » est le temps processeur du worker (boucle d'événements bloquée pendant la sérialisation).
+
+Usage (dans le conteneur api, après `python bench_search.py --seed`) :
+  python bench_serialization.py --user bench-heavy@example.com --rows 10000 --iterations 30
+"""
+
+import argparse, asyncio, json, statistics, time, uuid
+import asyncpg, orjson
+from fastapi.encoders import jsonable_encoder
+from database import get_pool, list_user_files_json
+from schemas import FileListResponse
+
+
+LIST_SQL = """
+SELECT id AS file_id, filename, size_bytes, mime_type, sha256, uploaded_at
+FROM public.file_metadata
+WHERE user_email = $1 AND deleted_at IS NULL
+ORDER BY uploaded_at DESC
+"""
+
+
+def legacy(rows) -> bytes:
+    files = [dict(row) for row in rows]
+    content = {
+        "files": [
+            {
+                "file_id": str(f["file_id"]),
+                "filename": f["filename"],
+                "size_bytes": f["size_bytes"],
+                "mime_type": f["mime_type"],
+                "sha256": f["sha256"],
+                "uploaded_at": f["uploaded_at"].isoformat(),
+            }
+            for f in files
+        ],
+        "total": len(files),
+    }
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def response_model(rows) -> bytes:
+    model = FileListResponse(files=[dict(row) for row in rows], total=len(rows))
+    return orjson.dumps(model.model_dump(mode="json"))
+
+
+def _encode_record(obj):
+    if isinstance(obj, asyncpg.Record):
+        return dict(obj)
+    if isinstance(obj, uuid.UUID):  # UUID d'asyncpg (sous-classe) non géré nativement par orjson
+        return str(obj)
+    raise TypeError
+
+
+def records_orjson(rows) -> bytes:
+    return orjson.dumps({"files": rows, "total": len(rows)}, default=_encode_record)
+
+
+def report(name: str, latencies: list[float], cpu: list[float]) -> None:
+    print(f"  {name:<16} médiane {statistics.median(latencies):7.2f} ms   max {max(latencies):7.2f} ms   CPU Python {statistics.median(cpu):7.2f} ms")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user", default="bench-heavy@example.com")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--iterations", type=int, default=30)
+    args = parser.parse_args()
+
+    # Utilisateur de travail avec exactement --rows fichiers (copie des premières lignes de --user)
+    user = "bench-serialization@example.com"
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        await conn.execute("DELETE FROM public.file_metadata WHERE user_email = $1", user)
+        await conn.execute(
+            """
+            INSERT INTO public.file_metadata
+                (user_email, filename, object_name, bucket_name, size_bytes, mime_type, sha256, uploaded_at)
+            SELECT $2, filename, object_name, bucket_name, size_bytes, mime_type, sha256, uploaded_at
+            FROM public.file_metadata
+            WHERE user_email = $1 AND deleted_at IS NULL
+            LIMIT $3
+            """,
+            args.user, user, args.rows,
+        )
+
+        async def fetch():
+            return await conn.fetch(LIST_SQL, user)
+
+        async def fetch_and(serialize):
+            return serialize(await fetch())
+
+        rows = await fetch()
+        if len(rows) < args.rows:
+            print(f"Seulement {len(rows)} lignes disponibles (lancer bench_search.py --seed)")
+        print(f"listing de {len(rows)} lignes, {args.iterations} itérations (lecture + sérialisation)")
+
+        for name, run in (
+            ("lecture seule", fetch),
+            ("legacy", lambda: fetch_and(legacy)),
+            ("response_model", lambda: fetch_and(response_model)),
+            ("records_orjson", lambda: fetch_and(records_orjson)),
+            ("json_agg", lambda: list_user_files_json(user)),
+        ):
+            await run()  # Échauffement
+            latencies, cpu = [], []
+            for _ in range(args.iterations):
+                start, start_cpu = time.perf_counter(), time.process_time()
+                await run()
+                latencies.append((time.perf_counter() - start) * 1000)
+                cpu.append((time.process_time() - start_cpu) * 1000)
+            report(name, latencies, cpu)
+
+        await conn.execute("DELETE FROM public.file_metadata WHERE user_email = $1", user)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,206 @@
+"""
+Vérification du routage par hachage cohérent et du rééquilibrage (Rebalancer.move_bucket).
+
+Les backends MinIO sont remplacés par le stand-in en mémoire (memory_s3.py), file_metadata
+est la vraie table PostgreSQL : les lignes de test (user_email 'check-sharding@example.com')
+sont supprimées à la fin.
+
+Usage (dans le conteneur api) :
+  python check_sharding.py
+"""
+
+import asyncio, io, sys, uuid
+import rebalancer
+from database import get_pool, insert_file_metadata
+from memory_s3 import InMemoryMinio
+from previews import PREVIEW_SIZES, preview_object_name
+from rebalancer import Rebalancer
+from storage import HashRing, StorageService
+
+
+CHECK_USER = "check-sharding@example.com"
+failures: list[str] = []
+
+
+def check(name: str, ok: bool, detail: str = "") -> None:
+    print(f"  {'OK   ' if ok else 'ÉCHEC'} {name}{f' ({detail})' if detail else ''}")
+    if not ok:
+        failures.append(name)
+
+
+def check_ring() -> None:
+    print("anneau")
+    keys = [f"user-{i}" for i in range(20_000)]
+    ring = HashRing(["a", "b", "c"])
+    check("routage déterministe", all(ring.get(k) == HashRing(["c", "a", "b"]).get(k) for k in keys[:1000]))
+
+    shares = {node: sum(ring.get(k) == node for k in keys) / len(keys) for node in "abc"}
+    check("répartition (100 nœuds virtuels)", all(0.5 / 3 < share < 1.5 / 3 for share in shares.values()),
+          ", ".join(f"{node} {share:.0%}" for node, share in shares.items()))
+
+    bigger = HashRing(["a", "b", "c", "d"])
+    moved = [k for k in keys if ring.get(k) != bigger.get(k)]
+    check("ajout d'un backend : seules les clés du nouveau backend bougent", all(bigger.get(k) == "d" for k in moved),
+          f"{len(moved) / len(keys):.0%} des buckets déplacés")
+
+
+def new_storage() -> StorageService:
+    return StorageService({"a": InMemoryMinio("a:9000"), "b": InMemoryMinio("b:9000")}, vnodes=100)
+
+
+def bucket_on(storage: StorageService, backend: str) -> str:
+    """Bucket neuf que l'anneau attribue à `backend`"""
+    while True:
+        bucket_name = f"check-{uuid.uuid4().hex[:12]}"
+        if storage.backend_for(bucket_name) == backend:
+            return bucket_name
+
+
+def put(storage: StorageService, backend: str, bucket_name: str, object_name: str) -> None:
+    client = storage.backends[backend]
+    if not client.bucket_exists(bucket_name):
+        client.make_bucket(bucket_name)
+    client.put_object(bucket_name, object_name, io.BytesIO(b"data"), 4, "image/png", {"sha256": "0" * 64})
+
+
+async def add_row(file_id: str, bucket_name: str, object_name: str, backend: str) -> None:
+    await insert_file_metadata(
+        file_id=file_id, user_email=CHECK_USER, filename="photo.png", bucket_name=bucket_name,
+        object_name=object_name, size_bytes=4, mime_type="image/png", sha256="0" * 64, backend=backend,
+    )
+
+
+async def add_file(storage: StorageService, backend: str, bucket_name: str, previews: bool = True, row: bool = True) -> str:
+    """Original (+ aperçus) sur `backend`, ligne file_metadata optionnelle. Renvoie l'object_name."""
+    file_id = str(uuid.uuid4())
+    object_name = f"{file_id}/photo.png"
+    put(storage, backend, bucket_name, object_name)
+    if previews:
+        for size in PREVIEW_SIZES:
+            put(storage, backend, bucket_name, preview_object_name(file_id, size))
+    if row:
+        await add_row(file_id, bucket_name, object_name, backend)
+    return object_name
+
+
+async def placement(storage: StorageService, bucket_name: str) -> dict[str, str]:
+    """object_name -> backend enregistré, pour chaque ligne dont l'objet n'est PAS sur ce backend"""
+    pool = await get_pool()
+    rows = await pool.fetch("SELECT object_name, backend FROM public.file_metadata WHERE bucket_name = $1", bucket_name)
+    broken = {}
+    for row in rows:
+        client = storage.backends[row["backend"]]
+        if row["object_name"] not in client.buckets.get(bucket_name, {}):
+            broken[row["object_name"]] = row["backend"]
+    return broken
+
+
+async def backend_of(object_name: str) -> str:
+    pool = await get_pool()
+    return await pool.fetchval("SELECT backend FROM public.file_metadata WHERE object_name = $1", object_name)
+
+
+async def check_move() -> None:
+    print("déplacement de bucket")
+
+    # Cas nominal : originaux et aperçus passent de a à b, a est vidé
+    storage = new_storage()
+    bucket_name = bucket_on(storage, "b")
+    for _ in range(20):
+        await add_file(storage, "a", bucket_name)
+    await Rebalancer(storage).move_bucket(bucket_name, "a", "b")
+    pool = await get_pool()
+    backends = await pool.fetch("SELECT DISTINCT backend FROM public.file_metadata WHERE bucket_name = $1", bucket_name)
+    check("lignes basculées", [row["backend"] for row in backends] == ["b"])
+    check("objets et aperçus copiés, ancien backend vidé",
+          len(storage.backends["b"].buckets[bucket_name]) == 20 * (1 + len(PREVIEW_SIZES))
+          and not storage.backends["a"].buckets[bucket_name])
+
+    # Upload sur l'ancien backend (worker avec l'ancien anneau) pendant la copie
+    storage = new_storage()
+    bucket_name = bucket_on(storage, "b")
+    for _ in range(5):
+        await add_file(storage, "a", bucket_name)
+    late: list[str] = []
+    copy_object = storage.copy_object
+
+    async def copy_with_late_upload(*args, **kwargs):
+        if not late:
+            late.append(await add_file(storage, "a", bucket_name))
+        await copy_object(*args, **kwargs)
+
+    storage.copy_object = copy_with_late_upload
+    await Rebalancer(storage).move_bucket(bucket_name, "a", "b")
+    broken = await placement(storage, bucket_name)
+    check("upload tardif : chaque ligne pointe vers le backend de son objet", not broken, f"{len(broken)} incohérente(s)")
+    check("upload tardif repris à la passe suivante", await backend_of(late[0]) == "b" and not storage.backends["a"].buckets[bucket_name])
+
+    # Même upload tardif lors de la dernière passe : la bascule ne doit pas toucher une ligne non copiée
+    storage = new_storage()
+    bucket_name = bucket_on(storage, "b")
+    for _ in range(5):
+        await add_file(storage, "a", bucket_name)
+    late.clear()
+    copy_object = storage.copy_object
+    storage.copy_object = copy_with_late_upload
+    max_rounds = rebalancer.MOVE_MAX_ROUNDS
+    rebalancer.MOVE_MAX_ROUNDS = 1
+    try:
+        await Rebalancer(storage).move_bucket(bucket_name, "a", "b")
+    finally:
+        rebalancer.MOVE_MAX_ROUNDS = max_rounds
+    broken = await placement(storage, bucket_name)
+    check("upload tardif à la dernière passe : ligne laissée sur l'ancien backend", not broken and await backend_of(late[0]) == "a",
+          f"{len(broken)} incohérente(s)")
+
+    # Objet copié avant que sa ligne n'existe, ligne insérée juste après la bascule
+    storage = new_storage()
+    bucket_name = bucket_on(storage, "b")
+    await add_file(storage, "a", bucket_name)
+    pending = await add_file(storage, "a", bucket_name, row=False)
+    move_bucket_backend = rebalancer.move_bucket_backend
+
+    async def move_then_insert(*args, **kwargs):
+        switched = await move_bucket_backend(*args, **kwargs)
+        if not await backend_of(pending):
+            await add_row(pending.split("/")[0], bucket_name, pending, "a")
+        return switched
+
+    rebalancer.move_bucket_backend = move_then_insert
+    try:
+        await Rebalancer(storage).move_bucket(bucket_name, "a", "b")
+    finally:
+        rebalancer.move_bucket_backend = move_bucket_backend
+    broken = await placement(storage, bucket_name)
+    check("ligne insérée après la bascule : aucune ligne orpheline", not broken, f"{len(broken)} incohérente(s)")
+    check("ligne insérée après la bascule : reprise à la passe suivante", await backend_of(pending) == "b")
+
+    # Upload encore en cours à la fin du déplacement : l'objet reste sur a, repris au rééquilibrage suivant
+    storage = new_storage()
+    bucket_name = bucket_on(storage, "b")
+    await add_file(storage, "a", bucket_name)
+    slow = await add_file(storage, "a", bucket_name, row=False)
+    await Rebalancer(storage).move_bucket(bucket_name, "a", "b")
+    await add_row(slow.split("/")[0], bucket_name, slow, "a")
+    broken = await placement(storage, bucket_name)
+    check("upload terminé après le déplacement : ligne cohérente", not broken and await backend_of(slow) == "a")
+    await Rebalancer(storage).move_bucket(bucket_name, "a", "b")
+    check("upload terminé après le déplacement : déplacé au rééquilibrage suivant",
+          await backend_of(slow) == "b" and not storage.backends["a"].buckets[bucket_name])
+
+
+async def main() -> None:
+    check_ring()
+    pool = await get_pool()
+    try:
+        await check_move()
+    finally:
+        await pool.execute("DELETE FROM public.file_metadata WHERE user_email = $1", CHECK_USER)
+    if failures:
+        print(f"{len(failures)} vérification(s) en échec")
+        sys.exit(1)
+    print("toutes les vérifications passent")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
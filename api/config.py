@@ -11,6 +11,11 @@ class Settings(BaseSettings):
     minio_secure: bool = False
     minio_bucket_prefix: str = "user"
     minio_quota_mb: int = 500
+    # Plusieurs backends : MINIO_BACKENDS='{"default": "minio:9000", "minio-2": "minio-2:9000"}'
+    minio_backends: dict[str, str] = {}
+    minio_public_urls: dict[str, str] = {"default": "https://s3.zerotrust.local"}
+    minio_vnodes: int = 100
+    rebalance_on_startup: bool = True
     database_url: str = "postgresql+asyncpg://postgres:changeme@db:5432/postgres"
 
     # Auth-JWT
@@ -33,6 +38,11 @@ class Settings(BaseSettings):
     max_file_size_mb: int = 100
     presigned_url_expiry_seconds: int = 900  # 15 mins
 
+    # Aperçus d'images
+    preview_workers: int = 2
+    preview_queue_size: int = 100
+    preview_max_pixels: int = 50_000_000  # au-delà, pas d'aperçu (décodage ~4 octets/pixel par worker)
+
     # CORS
     allowed_origins: list[str] = ["https://zerotrust.local"]
 
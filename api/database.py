@@ -1,12 +1,19 @@
 import asyncpg
 import structlog
 import os
+import re
+from datetime import datetime
 
 
 logger = structlog.get_logger()
 
 _pool: asyncpg.Pool | None = None
 
+# Seuil de l'opérateur <% (défaut pg_trgm : 0.6, trop strict pour une faute de frappe dans un mot court)
+SEARCH_WORD_SIMILARITY_THRESHOLD = 0.4
+# Rang maximal consultable (offset) : borne le parcours de l'index pour les recherches très larges
+SEARCH_MAX_OFFSET = 1000
+
 
 async def get_pool() -> asyncpg.Pool:
     global _pool
@@ -19,38 +26,126 @@ async def get_pool() -> asyncpg.Pool:
             database="postgres",
             min_size=2,
             max_size=10,
+            server_settings={"pg_trgm.word_similarity_threshold": str(SEARCH_WORD_SIMILARITY_THRESHOLD)},
         )
         logger.info("db_pool_created")
     return _pool
 
 
-async def insert_file_metadata(file_id: str, user_email: str, filename: str, bucket_name: str, object_name: str, size_bytes: int, mime_type: str, sha256: str) -> None:
+async def insert_file_metadata(file_id: str, user_email: str, filename: str, bucket_name: str, object_name: str, size_bytes: int, mime_type: str, sha256: str, backend: str) -> None:
     pool = await get_pool()
     async with pool.acquire() as conn:
         await conn.execute(
             """
             INSERT INTO public.file_metadata
-                (id, user_email, filename, bucket_name, object_name, size_bytes, mime_type, sha256)
-            VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+                (id, user_email, filename, bucket_name, object_name, size_bytes, mime_type, sha256, backend)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
             """,
-            file_id, user_email, filename, bucket_name, object_name, size_bytes, mime_type, sha256
+            file_id, user_email, filename, bucket_name, object_name, size_bytes, mime_type, sha256, backend
         )
     logger.info("metadata_inserted", file_id=file_id, user=user_email)
 
 
-async def list_user_files(user_email: str) -> list[dict]:
+async def list_user_files_json(user_email: str) -> bytes:
+    """Corps JSON de GET /files/ (format de FileListResponse), construit directement par PostgreSQL"""
     pool = await get_pool()
     async with pool.acquire() as conn:
-        rows = await conn.fetch(
+        return await conn.fetchval(
             """
-            SELECT id, filename, size_bytes, mime_type, sha256, uploaded_at
+            SELECT convert_to(json_build_object(
+                'files', coalesce(json_agg(json_build_object(
+                    'file_id', id,
+                    'filename', filename,
+                    'size_bytes', size_bytes,
+                    'mime_type', mime_type,
+                    'sha256', sha256,
+                    'uploaded_at', to_char(uploaded_at AT TIME ZONE 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS.US"+00:00"')
+                ) ORDER BY uploaded_at DESC), '[]'),
+                'total', count(*)
+            )::text, 'UTF8')
             FROM public.file_metadata
             WHERE user_email = $1 AND deleted_at IS NULL
-            ORDER BY uploaded_at DESC
             """,
             user_email
         )
-    return [dict(row) for row in rows]
+
+
+def _like_has_trigrams(query: str) -> bool:
+    """Le motif ILIKE '%query%' contient-il un trigramme indexable ?
+
+    Même découpage que pg_trgm : mots alphanumériques, bordés de 2 espaces à gauche et 1 à droite,
+    sauf du côté d'un joker (début et fin du motif).
+    """
+    words = re.split(r"[\W_]+", query)
+    last = len(words) - 1
+    return any(
+        len(word) + (2 if i > 0 else 0) + (1 if i < last else 0) >= 3
+        for i, word in enumerate(words)
+        if word
+    )
+
+
+async def search_user_files(user_email: str, query: str, mime_type: str | None = None, min_size: int | None = None, max_size: int | None = None, uploaded_after: datetime | None = None, uploaded_before: datetime | None = None, limit: int = 50, offset: int = 0) -> tuple[list[dict], int, bool]:
+    """Recherche par nom de fichier (sous-chaîne ou mot proche), triée par similarité décroissante.
+
+    Les correspondances sont lues dans l'ordre de l'index GiST (plus proches voisins), jusqu'à la fin de la page.
+    Renvoie (fichiers, total, tronqué) : si d'autres correspondances suivent, total est un minimum.
+    """
+    # pg_trgm ignore les caractères non alphanumériques : rien à chercher
+    if not re.search(r"[^\W_]", query):
+        return [], 0, False
+
+    conditions = ["user_email = $1", "deleted_at IS NULL"]
+    args: list = [user_email, query]
+    for clause, value in (
+        ("mime_type = ${}", mime_type),
+        ("size_bytes >= ${}", min_size),
+        ("size_bytes <= ${}", max_size),
+        ("uploaded_at >= ${}", uploaded_after),
+        ("uploaded_at < ${}", uploaded_before),
+    ):
+        if value is not None:
+            args.append(value)
+            conditions.append(clause.format(len(args)))
+
+    # Échapper les jokers LIKE pour une recherche littérale
+    escaped = re.sub(r"([\\%_])", r"\\\1", query)
+    pattern = len(args) + 1
+    if _like_has_trigrams(query):
+        # Mots proches d'abord, puis les sous-chaînes restantes : moins similaires que tout mot proche (< seuil)
+        branches = [
+            ("$2 <% filename", []),
+            (f"filename ILIKE ${pattern} AND NOT ($2 <% filename)", ["%" + escaped + "%"]),
+        ]
+    else:
+        # Aucun trigramme en sous-chaîne (ex. 1-2 caractères) : seul un préfixe est indexable
+        branches = [(f"filename ILIKE ${pattern}", [escaped + "%"])]
+
+    # Une ligne de plus que la page pour savoir si d'autres correspondances suivent
+    wanted = offset + limit + 1
+    matches: list[dict] = []
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        for branch, branch_args in branches:
+            # Parcours par distance croissante, arrêté à la ligne voulue : rien de plus proche n'est écarté,
+            # et l'ordre (égalités comprises) est le même d'une page à l'autre
+            rows = await conn.fetch(
+                f"""
+                SELECT id AS file_id, filename, size_bytes, mime_type, sha256, uploaded_at,
+                       round(word_similarity($2, filename)::numeric, 3)::float8 AS score
+                FROM public.file_metadata
+                WHERE {" AND ".join(conditions + [branch])}
+                ORDER BY $2 <<-> filename
+                LIMIT ${len(args) + len(branch_args) + 1}
+                """,
+                *args, *branch_args, wanted - len(matches)
+            )
+            matches.extend(dict(row) for row in rows)
+            if len(matches) >= wanted:
+                break
+
+    truncated = len(matches) > offset + limit
+    return matches[offset:offset + limit], min(len(matches), offset + limit), truncated
 
 
 async def delete_file_metadata(file_id: str, user_email: str) -> bool:
@@ -64,4 +159,110 @@ async def delete_file_metadata(file_id: str, user_email: str) -> bool:
             """,
             file_id, user_email
         )
-    return result == "UPDATE 1"
\ No newline at end of file
+    return result == "UPDATE 1"
+
+
+async def get_file_metadata(file_id: str, user_email: str) -> dict | None:
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        row = await conn.fetchrow(
+            """
+            SELECT id, filename, bucket_name, object_name, backend, size_bytes, mime_type, sha256, uploaded_at
+            FROM public.file_metadata
+            WHERE id = $1 AND user_email = $2 AND deleted_at IS NULL
+            """,
+            file_id, user_email
+        )
+    return dict(row) if row else None
+
+
+async def insert_file_preview(file_id: str, size: str, object_name: str, width: int, height: int, size_bytes: int) -> None:
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        await conn.execute(
+            """
+            INSERT INTO public.file_previews
+                (file_id, size, object_name, width, height, size_bytes)
+            VALUES ($1, $2, $3, $4, $5, $6)
+            ON CONFLICT (file_id, size) DO UPDATE
+                SET object_name = EXCLUDED.object_name, width = EXCLUDED.width,
+                    height = EXCLUDED.height, size_bytes = EXCLUDED.size_bytes
+            """,
+            file_id, size, object_name, width, height, size_bytes
+        )
+
+
+async def get_file_preview(file_id: str, size: str) -> dict | None:
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        row = await conn.fetchrow(
+            """
+            SELECT object_name, width, height, size_bytes
+            FROM public.file_previews
+            WHERE file_id = $1 AND size = $2
+            """,
+            file_id, size
+        )
+    return dict(row) if row else None
+
+
+async def list_backends() -> list[str]:
+    """Backends enregistrés (fichiers non supprimés) : un saut d'index par backend, sans parcours de la table"""
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            WITH RECURSIVE backends AS (
+                SELECT min(backend) AS backend FROM public.file_metadata WHERE deleted_at IS NULL
+                UNION ALL
+                SELECT (
+                    SELECT min(backend) FROM public.file_metadata
+                    WHERE deleted_at IS NULL AND backend > backends.backend
+                )
+                FROM backends
+                WHERE backends.backend IS NOT NULL
+            )
+            SELECT backend FROM backends WHERE backend IS NOT NULL
+            """
+        )
+    return [row["backend"] for row in rows]
+
+
+async def list_bucket_backends() -> list[dict]:
+    """Backend enregistré pour chaque bucket utilisateur (fichiers non supprimés), un saut d'index par couple"""
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            WITH RECURSIVE pairs AS (
+                (SELECT backend, bucket_name FROM public.file_metadata
+                 WHERE deleted_at IS NULL
+                 ORDER BY backend, bucket_name LIMIT 1)
+                UNION ALL
+                SELECT next.backend, next.bucket_name
+                FROM pairs, LATERAL (
+                    SELECT backend, bucket_name FROM public.file_metadata
+                    WHERE deleted_at IS NULL AND (backend, bucket_name) > (pairs.backend, pairs.bucket_name)
+                    ORDER BY backend, bucket_name LIMIT 1
+                ) next
+            )
+            SELECT bucket_name, backend FROM pairs
+            """
+        )
+    return [dict(row) for row in rows]
+
+
+async def move_bucket_backend(bucket_name: str, source_backend: str, target_backend: str, object_names: list[str]) -> list[str]:
+    """Bascule uniquement les fichiers dont l'objet a été copié. Renvoie leurs object_name."""
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            UPDATE public.file_metadata
+            SET backend = $3
+            WHERE bucket_name = $1 AND backend = $2 AND deleted_at IS NULL AND object_name = ANY($4::text[])
+            RETURNING object_name
+            """,
+            bucket_name, source_backend, target_backend, object_names
+        )
+    return [row["object_name"] for row in rows]
\ No newline at end of file
@@ -4,23 +4,28 @@ Endpoints dispos:
   POST /auth/verify-otp     : Valider le code rt obtenir JWT
   POST /files/upload        : Uploader un fichier (JWT requis)
   GET  /files/{file_id}     : Obtenir une pre-signed URL
+  GET  /files/{file_id}/preview : Obtenir un aperçu (miniature) d'une image
   GET  /files/              : Lister ses fichiers
+  GET  /files/search        : Rechercher ses fichiers par nom
   DELETE /files/{file_id}   : Supprimer un fichier
 """
 
-import hashlib, os, secrets, uuid, magic, structlog
+import asyncio, hashlib, os, secrets, uuid, magic, structlog
 from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone
-from fastapi import Depends, FastAPI, File, HTTPException, Request, UploadFile, status
+from fastapi import Depends, FastAPI, File, HTTPException, Query, Request, UploadFile, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse, Response
 from minio import Minio
 from minio.error import S3Error
 from pydantic import EmailStr
 from auth import TokenResponse, UserEmail, create_access_token, get_current_user, otp_store, send_otp_email
 from config import settings
-from storage import StorageService
-from database import insert_file_metadata, list_user_files, delete_file_metadata
+from storage import DEFAULT_BACKEND, StorageService
+from rebalancer import Rebalancer
+from previews import PREVIEW_CONTENT_TYPE, PREVIEW_MIME_TYPES, PREVIEW_SIZES, PreviewService, PreviewSize, preview_object_name
+from schemas import DownloadURLResponse, FileListResponse, FileSearchResponse, HealthResponse, MessageResponse, OTPRequestResponse, UploadResponse
+from database import SEARCH_MAX_OFFSET, insert_file_metadata, list_backends, list_user_files_json, search_user_files, delete_file_metadata, get_file_metadata, get_file_preview
 
 
 structlog.configure(
@@ -33,26 +38,54 @@ structlog.configure(
 logger = structlog.get_logger()
 
 
-# Client MinIO
-minio_client: Minio | None = None
+# Clients MinIO (un par backend)
+minio_clients: dict[str, Minio] = {}
 storage_service: StorageService | None = None
+preview_service: PreviewService | None = None
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    global minio_client, storage_service
-    minio_client = Minio(
-        settings.minio_endpoint,
-        access_key=settings.minio_access_key,
-        secret_key=settings.minio_secret_key,
-        secure=settings.minio_secure,
-    )
-    storage_service = StorageService(minio_client)
+    global minio_clients, storage_service, preview_service
+    endpoints = settings.minio_backends or {DEFAULT_BACKEND: settings.minio_endpoint}
+    minio_clients = {
+        name: Minio(
+            endpoint,
+            access_key=settings.minio_access_key,
+            secret_key=settings.minio_secret_key,
+            secure=settings.minio_secure,
+        )
+        for name, endpoint in endpoints.items()
+    }
+    storage_service = StorageService(minio_clients, vnodes=settings.minio_vnodes, public_urls=settings.minio_public_urls)
+    for name in minio_clients:
+        if name not in settings.minio_public_urls:
+            logger.warning("minio_public_url_missing", backend=name)
     from database import get_pool
     await get_pool()
-    logger.info("startup", minio_endpoint=settings.minio_endpoint)
+    # Un fichier enregistré sur un backend non configuré serait inaccessible (500) : refuser de démarrer
+    unknown = sorted(set(await list_backends()) - set(minio_clients))
+    if unknown:
+        logger.error("minio_backend_not_configured", backends=unknown)
+        raise RuntimeError(f"Backends MinIO enregistrés dans file_metadata mais absents de MINIO_BACKENDS : {', '.join(unknown)}")
+    preview_service = PreviewService(
+        storage_service,
+        workers=settings.preview_workers,
+        queue_size=settings.preview_queue_size,
+        max_pixels=settings.preview_max_pixels,
+    )
+    await preview_service.start()
+    # Déplacer en tâche de fond les buckets réaffectés (ex. : nouveau backend ajouté) ; inutile avec un seul backend
+    rebalance = settings.rebalance_on_startup and len(storage_service.backends) > 1
+    rebalance_task = asyncio.create_task(Rebalancer(storage_service).run()) if rebalance else None
+    logger.info("startup", minio_backends=endpoints)
     yield
+    if rebalance_task:
+        rebalance_task.cancel()
+        # Attendre l'annulation : le finally de Rebalancer.run libère le verrou consultatif
+        await asyncio.gather(rebalance_task, return_exceptions=True)
+    await preview_service.stop()
     logger.info("shutdown")
 
 
@@ -64,6 +97,7 @@ app = FastAPI(
     redoc_url="/redoc",
     root_path="/api",
     root_path_in_servers=False,
+    default_response_class=ORJSONResponse,
     lifespan=lifespan,
 )
 
@@ -78,7 +112,7 @@ app.add_middleware(
 
 
 
-@app.post("/auth/request-otp", summary="Demander un code OTP par email", tags=["Authentification OTP"])
+@app.post("/auth/request-otp", response_model=OTPRequestResponse, summary="Demander un code OTP par email", tags=["Authentification OTP"])
 async def request_otp(body: UserEmail, request: Request):
     """Génère un code OTP à 6 chiffres, l'envoie par email"""
     otp_code = secrets.randbelow(10**settings.otp_length)
@@ -98,11 +132,11 @@ async def request_otp(body: UserEmail, request: Request):
         client_ip=request.client.host,
     )
 
-    return {
-        "message": f"Code OTP envoyé à {body.email}",
-        "expires_in_seconds": settings.otp_expiry_seconds,
-        "_dev_otp": otp_str if settings.debug else None,
-    }
+    return OTPRequestResponse(
+        message=f"Code OTP envoyé à {body.email}",
+        expires_in_seconds=settings.otp_expiry_seconds,
+        dev_otp=otp_str if settings.debug else None,
+    )
 
 
 @app.post("/auth/verify-otp", response_model=TokenResponse, summary="Valider l'OTP et obtenir un JWT", tags=["Authentification OTP"])
@@ -215,7 +249,7 @@ async def validate_file(file: UploadFile) -> tuple[str, bytes]:
     return detected_mime, file_bytes
 
 
-@app.post("/files/upload", summary="Uploader un fichier (streaming vers MinIO)", tags=["Gestion des fichiers"])
+@app.post("/files/upload", response_model=UploadResponse, summary="Uploader un fichier (streaming vers MinIO)", tags=["Gestion des fichiers"])
 async def upload_file(file: UploadFile = File(...), current_user: str = Depends(get_current_user), request: Request = None):
     """Upload un fichier en streaming direct vers MinIO"""
     # Valider le fichier
@@ -229,11 +263,12 @@ async def upload_file(file: UploadFile = File(...), current_user: str = Depends(
     file_id = str(uuid.uuid4())
     safe_filename = f"{file_id}/{file.filename}"
 
-    # Bucket de l'utilisateur 
+    # Bucket de l'utilisateur et backend MinIO choisi par hachage cohérent
     bucket_name = storage_service.get_user_bucket(current_user)
+    backend = storage_service.backend_for(bucket_name)
 
     # Créer le bucket si nécessaire et appliquer quota
-    await storage_service.ensure_user_bucket(bucket_name, quota_mb=settings.minio_quota_mb)
+    await storage_service.ensure_user_bucket(bucket_name, quota_mb=settings.minio_quota_mb, backend=backend)
 
     # Streaming vers MinIO (pas de fichier temporaire sur disque !)
     await storage_service.upload_stream(
@@ -248,6 +283,7 @@ async def upload_file(file: UploadFile = File(...), current_user: str = Depends(
             "uploaded-by": current_user,
             "upload-timestamp": datetime.now(timezone.utc).isoformat(),
         },
+        backend=backend,
     )
 
     await insert_file_metadata(
@@ -259,8 +295,13 @@ async def upload_file(file: UploadFile = File(...), current_user: str = Depends(
         size_bytes=file_size,
         mime_type=mime_type,
         sha256=sha256_hash,
+        backend=backend,
     )
 
+    # Génération des miniatures en tâche de fond
+    if mime_type in PREVIEW_MIME_TYPES:
+        preview_service.enqueue(file_id, backend, bucket_name, safe_filename)
+
     logger.info(
         "file_uploaded",
         user=current_user,
@@ -272,27 +313,35 @@ async def upload_file(file: UploadFile = File(...), current_user: str = Depends(
         client_ip=getattr(request.client, "host", "unknown"),
     )
 
-    return {
-        "file_id": file_id,
-        "filename": file.filename,
-        "size_bytes": file_size,
-        "mime_type": mime_type,
-        "sha256": sha256_hash,
-        "bucket": bucket_name,
-        "message": "Fichier uploadé avec succès",
-    }
+    return UploadResponse(
+        file_id=file_id,
+        filename=file.filename,
+        size_bytes=file_size,
+        mime_type=mime_type,
+        sha256=sha256_hash,
+        bucket=bucket_name,
+        message="Fichier uploadé avec succès",
+    )
 
 
 # Distribution Sécurisée via Pre-signed URLs
-@app.get("/files/{file_id}/download", summary="Obtenir une pre-signed URL de téléchargement", tags=["Distribution sécurisée"])
-async def get_download_url(file_id: str, filename: str, current_user: str = Depends(get_current_user)):
+@app.get("/files/{file_id}/download", response_model=DownloadURLResponse, summary="Obtenir une pre-signed URL de téléchargement", tags=["Distribution sécurisée"])
+async def get_download_url(file_id: uuid.UUID, filename: str, current_user: str = Depends(get_current_user)):
     """Génère une pre-signed URL valide 15 minutes pour télécharger un fichier."""
     bucket_name = storage_service.get_user_bucket(current_user)
     object_name = f"{file_id}/{filename}"
 
+    # Backend enregistré à l'upload
+    file = await get_file_metadata(str(file_id), current_user)
+    if not file:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Fichier '{filename}' introuvable.",
+        )
+
     # Récupérer les métadonnées pour l'intégrité
     try:
-        stat = await storage_service.stat_object(bucket_name, object_name)
+        stat = await storage_service.stat_object(bucket_name, object_name, backend=file["backend"])
         sha256 = stat.metadata.get("x-amz-meta-sha256", "")
     except S3Error:
         raise HTTPException(
@@ -305,6 +354,7 @@ async def get_download_url(file_id: str, filename: str, current_user: str = Depe
         bucket_name=bucket_name,
         object_name=object_name,
         expiry_seconds=settings.presigned_url_expiry_seconds,
+        backend=file["backend"],
     )
 
     expiry_time = datetime.now(timezone.utc) + timedelta(
@@ -314,62 +364,131 @@ async def get_download_url(file_id: str, filename: str, current_user: str = Depe
     logger.info(
         "presigned_url_generated",
         user=current_user,
-        file_id=file_id,
+        file_id=str(file_id),
         expires_at=expiry_time.isoformat(),
     )
 
-    return {
-        "download_url": presigned_url,
-        "expires_at": expiry_time.isoformat(),
-        "expires_in_seconds": settings.presigned_url_expiry_seconds,
-        "sha256": sha256,
-        "instructions": (
+    return DownloadURLResponse(
+        download_url=presigned_url,
+        expires_at=expiry_time,
+        expires_in_seconds=settings.presigned_url_expiry_seconds,
+        sha256=sha256,
+        instructions=(
             "Téléchargez le fichier via cette URL avant son expiration. "
             "Vérifiez l'intégrité en comparant le hash SHA-256 du fichier téléchargé."
         ),
-    }
+    )
+
+
+@app.get(
+    "/files/{file_id}/preview",
+    response_class=Response,
+    responses={200: {"content": {PREVIEW_CONTENT_TYPE: {}}}},
+    summary="Obtenir un aperçu (miniature) d'une image",
+    tags=["Distribution sécurisée"],
+)
+async def get_preview(file_id: uuid.UUID, size: PreviewSize = "small", current_user: str = Depends(get_current_user)):
+    """Renvoie la miniature WebP d'une image, générée à la demande si elle n'existe pas encore."""
+    file = await get_file_metadata(str(file_id), current_user)
+    if not file:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Fichier introuvable.")
+    if file["mime_type"] not in PREVIEW_MIME_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Aucun aperçu disponible pour le type '{file['mime_type']}'.",
+        )
+
+    async def generate(force: bool = False) -> dict:
+        try:
+            await preview_service.ensure(str(file_id), file["backend"], file["bucket_name"], file["object_name"], force=force)
+        except Exception as e:
+            logger.error("preview_failed", user=current_user, file_id=str(file_id), error=str(e))
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Impossible de générer l'aperçu de ce fichier.",
+            )
+        return await get_file_preview(str(file_id), size)
 
+    preview = await get_file_preview(str(file_id), size) or await generate()
+    try:
+        content = await storage_service.get_object_bytes(file["bucket_name"], preview["object_name"], backend=file["backend"])
+    except S3Error as e:
+        # Aperçu enregistré mais objet absent (supprimé, déplacement de bucket...) : cache manquant, on régénère
+        logger.warning("preview_object_missing", user=current_user, file_id=str(file_id), size=size, error=str(e))
+        preview = await generate(force=True)
+        try:
+            content = await storage_service.get_object_bytes(file["bucket_name"], preview["object_name"], backend=file["backend"])
+        except S3Error:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Aperçu introuvable.")
+    return Response(
+        content=content,
+        media_type=PREVIEW_CONTENT_TYPE,
+        headers={"Cache-Control": "private, max-age=86400"},
+    )
 
-@app.get("/files/", summary="Lister les fichiers de l'utilisateur", tags=["Gestion des fichiers"])
+
+@app.get("/files/", response_model=FileListResponse, summary="Lister les fichiers de l'utilisateur", tags=["Gestion des fichiers"])
 async def list_files(current_user: str = Depends(get_current_user)):
     """Liste tous les fichiers"""
-    files = await list_user_files(current_user)
-    return {
-        "files": [
-            {
-                "file_id": str(f["id"]),
-                "filename": f["filename"],
-                "size_bytes": f["size_bytes"],
-                "mime_type": f["mime_type"],
-                "sha256": f["sha256"],
-                "uploaded_at": f["uploaded_at"].isoformat(),
-            }
-            for f in files
-        ],
-        "total": len(files),
-    }
+    # Corps JSON produit par PostgreSQL : aucun objet Python par ligne
+    return Response(content=await list_user_files_json(current_user), media_type="application/json")
+
+
+@app.get("/files/search", response_model=FileSearchResponse, summary="Rechercher ses fichiers par nom", tags=["Gestion des fichiers"])
+async def search_files(
+    q: str = Query(..., min_length=1, max_length=255, description="Nom ou partie du nom (tolère les fautes de frappe)"),
+    mime_type: str | None = None,
+    min_size: int | None = Query(None, ge=0),
+    max_size: int | None = Query(None, ge=0),
+    uploaded_after: datetime | None = None,
+    uploaded_before: datetime | None = None,
+    limit: int = Query(50, ge=1, le=100),
+    offset: int = Query(0, ge=0, lt=SEARCH_MAX_OFFSET),
+    current_user: str = Depends(get_current_user),
+):
+    """Recherche les fichiers de l'utilisateur par nom, triés par similarité (offset inférieur à 1000)."""
+    files, total, truncated = await search_user_files(
+        user_email=current_user,
+        query=q,
+        mime_type=mime_type,
+        min_size=min_size,
+        max_size=max_size,
+        uploaded_after=uploaded_after,
+        uploaded_before=uploaded_before,
+        limit=limit,
+        offset=offset,
+    )
+    return FileSearchResponse(files=files, total=total, truncated=truncated, limit=limit, offset=offset)
 
 
-@app.delete("/files/{file_id}", summary="Supprimer un fichier", tags=["Gestion des fichiers"])
-async def delete_file(file_id: str, filename: str,current_user: str = Depends(get_current_user)):
+@app.delete("/files/{file_id}", response_model=MessageResponse, summary="Supprimer un fichier", tags=["Gestion des fichiers"])
+async def delete_file(file_id: uuid.UUID, filename: str,current_user: str = Depends(get_current_user)):
     """Supprime un fichier du bucket utilisateur."""
+    file_id = str(file_id)
     bucket_name = storage_service.get_user_bucket(current_user)
     object_name = f"{file_id}/{filename}"
 
+    file = await get_file_metadata(file_id, current_user)
+    if not file:
+        raise HTTPException(status_code=404, detail="Fichier introuvable.")
+
     try:
-        await storage_service.delete_object(bucket_name, object_name)
+        await storage_service.delete_object(bucket_name, object_name, backend=file["backend"])
+        if file["mime_type"] in PREVIEW_MIME_TYPES:
+            for size in PREVIEW_SIZES:
+                await storage_service.delete_object(bucket_name, preview_object_name(file_id, size), backend=file["backend"])
         await delete_file_metadata(file_id, current_user)
     except S3Error:
         raise HTTPException(status_code=404, detail="Fichier introuvable.")
 
     logger.info("file_deleted", user=current_user, file_id=file_id, filename=filename)
-    return {"message": "Fichier supprimé avec succès"}
+    return MessageResponse(message="Fichier supprimé avec succès")
 
 
 # Health check
-@app.get("/health", tags=["Système"])
+@app.get("/health", response_model=HealthResponse, tags=["Système"])
 async def health_check():
-    return {"status": "ok", "service": "zerotrust-api"}
+    return HealthResponse(status="ok", service="zerotrust-api")
 
 
 # documentation personnalisée (Swagger UI)
@@ -0,0 +1,114 @@
+"""
+Stand-in en mémoire du client MinIO (sous-ensemble utilisé par StorageService).
+
+Permet de vérifier le routage et le rééquilibrage sans déploiement MinIO (voir check_sharding.py).
+"""
+
+import hashlib
+import threading
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from urllib.parse import quote
+from minio.error import S3Error
+
+
+class _Response:
+    """Réponse de get_object : read(), close(), release_conn() et en-têtes HTTP"""
+
+    def __init__(self, data: bytes, headers: dict[str, str]):
+        self._data = data
+        self.headers = headers
+
+    def read(self) -> bytes:
+        return self._data
+
+    def close(self) -> None:
+        pass
+
+    def release_conn(self) -> None:
+        pass
+
+
+class InMemoryMinio:
+    """Client MinIO en mémoire : buckets, objets (contenu, type, métadonnées) et tags"""
+
+    def __init__(self, endpoint: str = "memory:9000"):
+        self.endpoint = endpoint
+        self.buckets: dict[str, dict[str, dict]] = {}
+        self.tags: dict[str, dict] = {}
+        self._lock = threading.Lock()  # appels depuis asyncio.to_thread
+
+    def _error(self, code: str, bucket_name: str, object_name: str | None = None) -> S3Error:
+        return S3Error(code, code, f"/{bucket_name}/{object_name or ''}", None, None, None, bucket_name, object_name)
+
+    def _bucket(self, bucket_name: str) -> dict[str, dict]:
+        if bucket_name not in self.buckets:
+            raise self._error("NoSuchBucket", bucket_name)
+        return self.buckets[bucket_name]
+
+    def _object(self, bucket_name: str, object_name: str) -> dict:
+        objects = self._bucket(bucket_name)
+        if object_name not in objects:
+            raise self._error("NoSuchKey", bucket_name, object_name)
+        return objects[object_name]
+
+    def bucket_exists(self, bucket_name: str) -> bool:
+        return bucket_name in self.buckets
+
+    def make_bucket(self, bucket_name: str) -> None:
+        with self._lock:
+            if bucket_name in self.buckets:
+                raise self._error("BucketAlreadyOwnedByYou", bucket_name)
+            self.buckets[bucket_name] = {}
+
+    def set_bucket_tags(self, bucket_name: str, tags) -> None:
+        self._bucket(bucket_name)
+        self.tags[bucket_name] = dict(tags)
+
+    def put_object(self, bucket_name: str, object_name: str, data, length: int, content_type: str = "application/octet-stream", metadata: dict[str, str] | None = None):
+        content = data.read(length)
+        with self._lock:
+            self._bucket(bucket_name)[object_name] = {
+                "data": content,
+                "content_type": content_type,
+                "metadata": dict(metadata or {}),
+                "etag": hashlib.md5(content, usedforsecurity=False).hexdigest(),
+                "last_modified": datetime.now(timezone.utc),
+            }
+        return SimpleNamespace(bucket_name=bucket_name, object_name=object_name)
+
+    def get_object(self, bucket_name: str, object_name: str) -> _Response:
+        obj = self._object(bucket_name, object_name)
+        headers = {"Content-Type": obj["content_type"], "Content-Length": str(len(obj["data"]))}
+        headers.update({f"x-amz-meta-{key}": value for key, value in obj["metadata"].items()})
+        return _Response(obj["data"], headers)
+
+    def stat_object(self, bucket_name: str, object_name: str):
+        obj = self._object(bucket_name, object_name)
+        return SimpleNamespace(
+            bucket_name=bucket_name,
+            object_name=object_name,
+            size=len(obj["data"]),
+            etag=obj["etag"],
+            content_type=obj["content_type"],
+            last_modified=obj["last_modified"],
+            metadata=obj["metadata"],
+        )
+
+    def list_objects(self, bucket_name: str, prefix: str | None = None, recursive: bool = False):
+        with self._lock:
+            objects = sorted(self._bucket(bucket_name).items())
+        return [
+            SimpleNamespace(object_name=name, size=len(obj["data"]), etag=obj["etag"], last_modified=obj["last_modified"])
+            for name, obj in objects
+            if not prefix or name.startswith(prefix)
+        ]
+
+    def remove_object(self, bucket_name: str, object_name: str) -> None:
+        # Comme S3 : supprimer un objet absent n'est pas une erreur
+        with self._lock:
+            self._bucket(bucket_name).pop(object_name, None)
+
+    def presigned_get_object(self, bucket_name: str, object_name: str, expires=None) -> str:
+        self._object(bucket_name, object_name)
+        return f"http://{self.endpoint}/{bucket_name}/{quote(object_name)}?X-Amz-Expires={int(expires.total_seconds()) if expires else 604800}"
@@ -0,0 +1,136 @@
+import asyncio
+import io
+import multiprocessing
+import structlog
+from concurrent.futures import ProcessPoolExecutor
+from typing import Literal
+from PIL import Image, ImageOps
+from storage import StorageService
+from database import get_file_preview, insert_file_preview
+
+
+logger = structlog.get_logger()
+
+
+# Aperçus générés pour chaque image (nom -> côté max en pixels)
+PREVIEW_SIZES = {"small": 128, "medium": 512}
+PreviewSize = Literal["small", "medium"]
+PREVIEW_MIME_TYPES = {"image/jpeg", "image/png", "image/webp", "image/gif"}
+PREVIEW_CONTENT_TYPE = "image/webp"
+
+
+def preview_object_name(file_id: str, size: str) -> str:
+    """Objet dérivé, rangé à côté de l'original ({file_id}/{filename})"""
+    return f"{file_id}/previews/{size}.webp"
+
+
+def render_previews(data: bytes, sizes: dict[str, int], max_pixels: int) -> dict[str, tuple[bytes, int, int]]:
+    """Génère les aperçus WebP (exécuté dans le pool de processus).
+    Lève ValueError si l'image dépasse max_pixels (bombe de décompression)."""
+    previews = {}
+    with Image.open(io.BytesIO(data)) as image:
+        # Dimensions lues dans l'en-tête : rien n'est décodé avant ce contrôle
+        if image.width * image.height > max_pixels:
+            raise ValueError(f"image trop grande ({image.width}x{image.height} px, maximum {max_pixels} px)")
+        # JPEG : décodage directement réduit (1/2 à 1/8), sans descendre sous le plus grand aperçu
+        largest = max(sizes.values())
+        image.draft("RGB", (largest, largest))
+        image.seek(0)  # GIF animé : première image
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+        # Du plus grand au plus petit pour réutiliser la réduction précédente
+        for name, px in sorted(sizes.items(), key=lambda item: item[1], reverse=True):
+            image.thumbnail((px, px), Image.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, format="WEBP", quality=80, method=4)
+            previews[name] = (buffer.getvalue(), image.width, image.height)
+    return previews
+
+
+class PreviewService:
+    """Génération des aperçus d'images en tâche de fond (file asyncio + pool de processus)"""
+
+    def __init__(self, storage: StorageService, workers: int = 2, queue_size: int = 100, max_pixels: int = 50_000_000):
+        self.storage = storage
+        self.workers = workers
+        self.max_pixels = max_pixels
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.executor: ProcessPoolExecutor | None = None
+        self._tasks: list[asyncio.Task] = []
+        # Générations en cours, partagées entre la file et les requêtes GET.
+        # Clé (file_id, force) : une régénération forcée ne rejoint pas une génération qui peut s'arrêter
+        # sur « déjà générés »
+        self._inflight: dict[tuple[str, bool], asyncio.Future] = {}
+
+    async def start(self) -> None:
+        # spawn : pas de fork d'un processus qui a déjà des threads (asyncio.to_thread)
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info("preview_service_started", workers=self.workers)
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        logger.info("preview_service_stopped")
+
+    def enqueue(self, file_id: str, backend: str, bucket_name: str, object_name: str) -> None:
+        """Planifie la génération après un upload. Si la file est pleine, l'aperçu sera généré à la demande."""
+        # Seules les références sont en file : l'original est relu depuis MinIO par le worker
+        try:
+            self.queue.put_nowait((file_id, backend, bucket_name, object_name))
+        except asyncio.QueueFull:
+            logger.warning("preview_queue_full", file_id=file_id)
+
+    async def ensure(self, file_id: str, backend: str, bucket_name: str, object_name: str, force: bool = False) -> None:
+        """Génère les aperçus d'un fichier, une seule fois même en cas de requêtes concurrentes.
+        force : régénère même si les aperçus sont enregistrés (objet absent du stockage)."""
+        key = (file_id, force)
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._generate(file_id, backend, bucket_name, object_name, force))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        await asyncio.shield(future)
+
+    async def _generate(self, file_id: str, backend: str, bucket_name: str, object_name: str, force: bool) -> None:
+        # Déjà générés (ex. : à la demande avant que la file ne traite l'upload)
+        if not force and all([await get_file_preview(file_id, size) for size in PREVIEW_SIZES]):
+            return
+
+        data = await self.storage.get_object_bytes(bucket_name, object_name, backend=backend)
+
+        loop = asyncio.get_running_loop()
+        previews = await loop.run_in_executor(self.executor, render_previews, data, PREVIEW_SIZES, self.max_pixels)
+
+        for size, (content, width, height) in previews.items():
+            preview_name = preview_object_name(file_id, size)
+            await self.storage.upload_stream(
+                bucket_name=bucket_name,
+                object_name=preview_name,
+                data=content,
+                size=len(content),
+                content_type=PREVIEW_CONTENT_TYPE,
+                backend=backend,
+            )
+            await insert_file_preview(
+                file_id=file_id,
+                size=size,
+                object_name=preview_name,
+                width=width,
+                height=height,
+                size_bytes=len(content),
+            )
+        logger.info("previews_generated", file_id=file_id, sizes=list(previews))
+
+    async def _worker(self) -> None:
+        while True:
+            file_id, backend, bucket_name, object_name = await self.queue.get()
+            try:
+                await self.ensure(file_id, backend, bucket_name, object_name)
+            except Exception as e:
+                logger.error("preview_failed", file_id=file_id, error=str(e))
+            finally:
+                self.queue.task_done()
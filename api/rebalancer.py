@@ -0,0 +1,93 @@
+import structlog
+from config import settings
+from storage import StorageService
+from database import get_pool, list_bucket_backends, move_bucket_backend
+
+
+logger = structlog.get_logger()
+
+
+# Verrou consultatif Postgres : un seul rééquilibrage à la fois (plusieurs workers uvicorn)
+REBALANCE_LOCK_KEY = 0x7A7275
+# Passes de copie par bucket : les objets écrits sur l'ancien backend pendant le déplacement sont repris à la passe suivante
+MOVE_MAX_ROUNDS = 5
+
+
+def _file_prefix(object_name: str) -> str:
+    """Préfixe {file_id} commun à l'original et à ses aperçus"""
+    return object_name.split("/", 1)[0]
+
+
+class Rebalancer:
+    """Déplace les buckets dont le backend enregistré ne correspond plus à l'anneau (après ajout d'un backend et redémarrage)"""
+
+    def __init__(self, storage: StorageService):
+        self.storage = storage
+
+    async def run(self) -> int:
+        """Rééquilibre tous les buckets concernés. Renvoie le nombre de buckets déplacés."""
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", REBALANCE_LOCK_KEY):
+                logger.info("rebalance_skipped", reason="lock_held")
+                return 0
+            try:
+                return await self._rebalance()
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1)", REBALANCE_LOCK_KEY)
+
+    async def _rebalance(self) -> int:
+        moved = 0
+        for row in await list_bucket_backends():
+            bucket_name, source = row["bucket_name"], row["backend"]
+            target = self.storage.backend_for(bucket_name)
+            if source == target:
+                continue
+            if source not in self.storage.backends:
+                logger.warning("rebalance_unknown_backend", bucket=bucket_name, backend=source)
+                continue
+            try:
+                await self.move_bucket(bucket_name, source, target)
+                moved += 1
+            except Exception as e:
+                logger.error("rebalance_failed", bucket=bucket_name, source=source, target=target, error=str(e))
+        logger.info("rebalance_done", buckets_moved=moved)
+        return moved
+
+    async def move_bucket(self, bucket_name: str, source: str, target: str) -> None:
+        """Copie les objets du bucket vers le nouveau backend, bascule les métadonnées puis nettoie l'ancien.
+
+        Seules les lignes dont l'objet a été copié sont basculées, et seuls les objets des fichiers basculés
+        (original et aperçus) sont supprimés de l'ancien backend. Un upload concurrent vers l'ancien backend
+        reste donc cohérent : il est repris à la passe suivante, ou au prochain rééquilibrage.
+        """
+        await self.storage.ensure_user_bucket(bucket_name, quota_mb=settings.minio_quota_mb, backend=target)
+
+        copied: set[str] = set()
+        moved_files: set[str] = set()
+        rows = 0
+        for _ in range(MOVE_MAX_ROUNDS):
+            objects = [obj["object_name"] for obj in await self.storage.list_objects(bucket_name, backend=source)]
+            new_objects = [name for name in objects if name not in copied]
+            for object_name in new_objects:
+                await self.storage.copy_object(bucket_name, object_name, source, target)
+            copied.update(new_objects)
+
+            # Les lectures suivent file_metadata : l'ancien backend reste valide jusqu'ici
+            switched = await move_bucket_backend(bucket_name, source, target, sorted(copied))
+            rows += len(switched)
+            moved_files.update(_file_prefix(name) for name in switched)
+
+            stale = [name for name in objects if _file_prefix(name) in moved_files]
+            for object_name in stale:
+                await self.storage.delete_object(bucket_name, object_name, backend=source)
+            copied.difference_update(stale)
+
+            # Plus rien à reprendre : les objets restants n'ont pas (encore) de ligne sur l'ancien backend
+            if not new_objects and not switched and not stale:
+                break
+
+        remaining = len(copied)
+        if remaining:
+            logger.warning("bucket_rebalance_incomplete", bucket=bucket_name, source=source, target=target, objects_left=remaining)
+        logger.info("bucket_rebalanced", bucket=bucket_name, source=source, target=target, rows=rows, objects_left=remaining)
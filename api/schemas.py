@@ -0,0 +1,70 @@
+from datetime import datetime
+from typing import Annotated
+from uuid import UUID
+from pydantic import BaseModel, Field, PlainSerializer
+
+
+# Horodatages : même format sur toutes les routes, y compris le listing construit par PostgreSQL
+# (2026-10-19T13:00:00.000000+00:00, voir database.list_user_files_json)
+Timestamp = Annotated[datetime, PlainSerializer(lambda dt: dt.isoformat(timespec="microseconds"), return_type=str, when_used="json")]
+
+
+# Schémas Pydantic des réponses
+class OTPRequestResponse(BaseModel):
+    message: str
+    expires_in_seconds: int
+    dev_otp: str | None = Field(None, serialization_alias="_dev_otp")
+
+
+class UploadResponse(BaseModel):
+    file_id: UUID
+    filename: str | None
+    size_bytes: int
+    mime_type: str
+    sha256: str
+    bucket: str
+    message: str
+
+
+class DownloadURLResponse(BaseModel):
+    download_url: str
+    expires_at: Timestamp
+    expires_in_seconds: int
+    sha256: str
+    instructions: str
+
+
+class FileInfo(BaseModel):
+    file_id: UUID
+    filename: str
+    size_bytes: int
+    mime_type: str
+    sha256: str
+    uploaded_at: Timestamp
+
+
+class FileListResponse(BaseModel):
+    files: list[FileInfo]
+    total: int
+
+
+class FileSearchResult(FileInfo):
+    score: float
+
+
+class FileSearchResponse(BaseModel):
+    files: list[FileSearchResult]
+    total: int
+    truncated: bool  # d'autres correspondances suivent cette page (total est alors un minimum)
+    limit: int
+    offset: int
+
+
+class MessageResponse(BaseModel):
+    message: str
+
+
+class HealthResponse(BaseModel):
+    status: str
+    service: str
+
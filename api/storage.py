@@ -1,9 +1,12 @@
 import asyncio
+import bisect
+import hashlib
 import io
 import re
 import structlog
 from datetime import timedelta
-from typing import Any
+from typing import Any, Iterable
+from urllib.parse import urlsplit, urlunsplit
 from minio import Minio
 from minio.commonconfig import Tags
 from minio.error import S3Error
@@ -12,11 +15,58 @@ from minio.error import S3Error
 logger = structlog.get_logger()
 
 
+DEFAULT_BACKEND = "default"
+
+
+class HashRing:
+    """Anneau de hachage cohérent avec nœuds virtuels."""
+
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = 100):
+        self.vnodes = vnodes
+        self._hashes: list[int] = []
+        self._nodes: list[str] = []
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode(), usedforsecurity=False).digest()[:8], "big")
+
+    def add(self, node: str) -> None:
+        for i in range(self.vnodes):
+            h = self._hash(f"{node}#{i}")
+            index = bisect.bisect(self._hashes, h)
+            self._hashes.insert(index, h)
+            self._nodes.insert(index, node)
+
+    def get(self, key: str) -> str:
+        """Premier nœud virtuel après le hash de la clé (sens horaire)."""
+        if not self._hashes:
+            raise LookupError("Aucun backend de stockage configuré")
+        index = bisect.bisect(self._hashes, self._hash(key)) % len(self._hashes)
+        return self._nodes[index]
+
+
 class StorageService:
-    """Service de stockage MinIO - Zero Trust."""
+    """Service de stockage MinIO - Zero Trust, réparti entre plusieurs backends par hachage cohérent."""
 
-    def __init__(self, client: Minio):
-        self.client = client
+    # Lectures : backend enregistré dans file_metadata (`backend=`). Écritures : routées par l'anneau.
+    # Backends fixés par la configuration (MINIO_BACKENDS) : tous les workers uvicorn ont le même anneau.
+
+    def __init__(self, backends: Minio | dict[str, Minio], vnodes: int = 100, public_urls: dict[str, str] | None = None):
+        if not isinstance(backends, dict):
+            backends = {DEFAULT_BACKEND: backends}
+        self.backends = dict(backends)
+        self.public_urls = public_urls or {}
+        self.ring = HashRing(self.backends, vnodes=vnodes)
+
+    def backend_for(self, bucket_name: str) -> str:
+        """Backend cible d'un bucket utilisateur selon l'anneau."""
+        return self.ring.get(bucket_name)
+
+    def client_for(self, bucket_name: str, backend: str | None = None) -> Minio:
+        """Client du backend enregistré, ou de celui choisi par l'anneau."""
+        return self.backends[backend or self.backend_for(bucket_name)]
 
     def get_user_bucket(self, email: str) -> str:
         """Convertit un email en nom de bucket MinIO valide"""
@@ -26,27 +76,31 @@ class StorageService:
         # Limiter à 63 caractères
         return bucket_name[:63]
 
-    async def ensure_user_bucket(self, bucket_name: str, quota_mb: int = 500) -> None:
+    async def ensure_user_bucket(self, bucket_name: str, quota_mb: int = 500, backend: str | None = None) -> None:
         """Crée le bucket utilisateur et Applique le quota de stockage (500 Mo par défaut)"""
+        client = self.client_for(bucket_name, backend)
+
         def _create():
-            if not self.client.bucket_exists(bucket_name):
-                self.client.make_bucket(bucket_name)
-                logger.info("bucket_created", bucket=bucket_name)
+            if not client.bucket_exists(bucket_name):
+                client.make_bucket(bucket_name)
+                logger.info("bucket_created", bucket=bucket_name, backend=backend)
 
             try:
                 tags = Tags.new_bucket_tags()
                 tags["quota-mb"] = str(quota_mb)
                 tags["owner-email-hint"] = bucket_name
-                self.client.set_bucket_tags(bucket_name, tags)
+                client.set_bucket_tags(bucket_name, tags)
             except S3Error:
                 pass  # Tags non critiques
 
         await asyncio.to_thread(_create)
 
-    async def upload_stream(self, bucket_name: str, object_name: str, data: bytes, size: int, content_type: str, metadata: dict[str, str] | None = None) -> None:
+    async def upload_stream(self, bucket_name: str, object_name: str, data: bytes, size: int, content_type: str, metadata: dict[str, str] | None = None, backend: str | None = None) -> None:
         """Upload les bytes directement vers MinIO en streaming"""
+        client = self.client_for(bucket_name, backend)
+
         def _upload():
-            self.client.put_object(
+            client.put_object(
                 bucket_name=bucket_name,
                 object_name=object_name,
                 data=io.BytesIO(data),
@@ -61,40 +115,65 @@ class StorageService:
             bucket=bucket_name,
             object=object_name,
             size=size,
+            backend=backend,
         )
 
-    async def generate_presigned_url(self, bucket_name: str, object_name: str, expiry_seconds: int = 900) -> str:
+    async def generate_presigned_url(self, bucket_name: str, object_name: str, expiry_seconds: int = 900, backend: str | None = None) -> str:
         """Génère une pre-signed URL"""
+        backend = backend or self.backend_for(bucket_name)
+        client = self.backends[backend]
+
         def _presign():
-            return self.client.presigned_get_object(
+            return client.presigned_get_object(
                 bucket_name=bucket_name,
                 object_name=object_name,
                 expires=timedelta(seconds=expiry_seconds),
             )
 
         url = await asyncio.to_thread(_presign)
-	# Remplacer l'URL interne MinIO par l'URL publique
-        url = url.replace("http://minio:9000", "https://s3.zerotrust.local")
+        # Remplacer l'URL interne MinIO par l'URL publique du backend
+        public_url = self.public_urls.get(backend)
+        if public_url:
+            url = urlunsplit(urlsplit(public_url)[:2] + urlsplit(url)[2:])
 
         logger.info(
             "presigned_url_created",
             bucket=bucket_name,
             object=object_name,
             expiry_seconds=expiry_seconds,
+            backend=backend,
         )
         return url
 
-    async def stat_object(self, bucket_name: str, object_name: str) -> Any:
+    async def stat_object(self, bucket_name: str, object_name: str, backend: str | None = None) -> Any:
         """Récupère les métadonnées d'un objet."""
+        client = self.client_for(bucket_name, backend)
+
         def _stat():
-            return self.client.stat_object(bucket_name, object_name)
+            return client.stat_object(bucket_name, object_name)
 
         return await asyncio.to_thread(_stat)
 
-    async def list_objects(self, bucket_name: str) -> list[dict]:
+    async def get_object_bytes(self, bucket_name: str, object_name: str, backend: str | None = None) -> bytes:
+        """Télécharge le contenu d'un objet."""
+        client = self.client_for(bucket_name, backend)
+
+        def _get():
+            response = client.get_object(bucket_name, object_name)
+            try:
+                return response.read()
+            finally:
+                response.close()
+                response.release_conn()
+
+        return await asyncio.to_thread(_get)
+
+    async def list_objects(self, bucket_name: str, backend: str | None = None) -> list[dict]:
         """Liste les objets d'un bucket."""
+        client = self.client_for(bucket_name, backend)
+
         def _list():
-            objects = self.client.list_objects(bucket_name, recursive=True)
+            objects = client.list_objects(bucket_name, recursive=True)
             return [
                 {
                     "object_name": obj.object_name,
@@ -107,10 +186,42 @@ class StorageService:
 
         return await asyncio.to_thread(_list)
 
-    async def delete_object(self, bucket_name: str, object_name: str) -> None:
+    async def delete_object(self, bucket_name: str, object_name: str, backend: str | None = None) -> None:
         """Supprime un objet."""
+        client = self.client_for(bucket_name, backend)
+
         def _delete():
-            self.client.remove_object(bucket_name, object_name)
+            client.remove_object(bucket_name, object_name)
 
         await asyncio.to_thread(_delete)
-        logger.info("object_deleted", bucket=bucket_name, object=object_name)
\ No newline at end of file
+        logger.info("object_deleted", bucket=bucket_name, object=object_name, backend=backend)
+
+    async def copy_object(self, bucket_name: str, object_name: str, source_backend: str, target_backend: str) -> None:
+        """Copie un objet (contenu, type et métadonnées) d'un backend à un autre."""
+        source = self.backends[source_backend]
+        target = self.backends[target_backend]
+
+        def _copy():
+            response = source.get_object(bucket_name, object_name)
+            try:
+                data = response.read()
+                content_type = response.headers.get("Content-Type", "application/octet-stream")
+                metadata = {
+                    key[len("x-amz-meta-"):]: value
+                    for key, value in response.headers.items()
+                    if key.lower().startswith("x-amz-meta-")
+                }
+            finally:
+                response.close()
+                response.release_conn()
+            target.put_object(
+                bucket_name=bucket_name,
+                object_name=object_name,
+                data=io.BytesIO(data),
+                length=len(data),
+                content_type=content_type,
+                metadata=metadata,
+            )
+
+        await asyncio.to_thread(_copy)
+        logger.info("object_copied", bucket=bucket_name, object=object_name, source=source_backend, target=target_backend)
\ No newline at end of file
@@ -14,6 +14,10 @@ CREATE ROLE supabase_auth_admin NOINHERIT LOGIN PASSWORD 'supabase_auth_pass';
 CREATE SCHEMA IF NOT EXISTS auth AUTHORIZATION supabase_auth_admin;
 GRANT ALL ON SCHEMA auth TO supabase_auth_admin;
 
+-- Extensions pour la recherche de fichiers (trigrammes + btree dans GiST)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
 -- Table : métadonnées des fichiers uploadé
 CREATE TABLE IF NOT EXISTS public.file_metadata (
     id            UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -24,6 +28,7 @@ CREATE TABLE IF NOT EXISTS public.file_metadata (
     size_bytes    BIGINT NOT NULL,
     mime_type     TEXT NOT NULL,
     sha256        TEXT NOT NULL,
+    backend       TEXT NOT NULL DEFAULT 'default',  -- backend MinIO (hachage cohérent)
     uploaded_at   TIMESTAMPTZ NOT NULL DEFAULT NOW(),
     deleted_at    TIMESTAMPTZ,
 
@@ -33,6 +38,28 @@ CREATE TABLE IF NOT EXISTS public.file_metadata (
 -- Index pour recherche par utilisateur
 CREATE INDEX idx_file_metadata_user ON public.file_metadata(user_email);
 CREATE INDEX idx_file_metadata_uploaded ON public.file_metadata(uploaded_at DESC);
+-- Backend en tête : backends et couples (backend, bucket) lus par sauts d'index (démarrage, rééquilibrage)
+CREATE INDEX idx_file_metadata_backend_bucket ON public.file_metadata(backend, bucket_name) WHERE deleted_at IS NULL;
+
+-- Index pour la recherche par nom de fichier (sous-chaîne + similarité), restreint aux fichiers
+-- non supprimés, filtré par utilisateur et type MIME, parcouru par similarité (plus proches voisins).
+-- siglen=512 : signatures assez larges pour élaguer l'arbre (défaut 12 octets, saturé dès quelques noms)
+CREATE INDEX idx_file_metadata_filename_trgm
+    ON public.file_metadata USING GIST (user_email, mime_type, filename gist_trgm_ops(siglen=512))
+    WHERE deleted_at IS NULL;
+
+-- Table : aperçus (miniatures) générés pour les images
+CREATE TABLE IF NOT EXISTS public.file_previews (
+    file_id       UUID NOT NULL REFERENCES public.file_metadata(id) ON DELETE CASCADE,
+    size          TEXT NOT NULL,  -- 'small', 'medium'
+    object_name   TEXT NOT NULL,
+    width         INTEGER NOT NULL,
+    height        INTEGER NOT NULL,
+    size_bytes    BIGINT NOT NULL,
+    created_at    TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+
+    PRIMARY KEY (file_id, size)
+);
 
 -- RLS (Row Level Security): chaque utilisateur ne voit que ses fichiers
 ALTER TABLE public.file_metadata ENABLE ROW LEVEL SECURITY;